@@ -0,0 +1,136 @@
+"""
+Licensed to the Apache Software Foundation (ASF) under one
+or more contributor license agreements.  See the NOTICE file
+distributed with this work for additional information
+regarding copyright ownership.  The ASF licenses this file
+to you under the Apache License, Version 2.0 (the
+"License"); you may not use this file except in compliance
+with the License.  You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import logging
+from unittest import TestCase
+from mock.mock import patch, MagicMock
+from resource_management.core import logger
+from resource_management.core.logger import Logger
+from resource_management.core.utils import PasswordString
+
+
+class TestLogger(TestCase):
+
+  def setUp(self):
+    self.old_logger = Logger.logger
+    self.old_sensitive_strings = Logger.sensitive_strings
+    Logger.logger = MagicMock()
+    Logger.sensitive_strings = {}
+    # force filter_text to rebuild its replacements for every test
+    logger._filter = None
+
+  def tearDown(self):
+    Logger.logger = self.old_logger
+    Logger.sensitive_strings = self.old_sensitive_strings
+    # don't leave a filter built from this test's strings to other test modules
+    logger._filter = None
+
+  @patch.object(Logger, "filter_text")
+  def test_debug_skipped_when_level_disabled(self, filter_text_mock):
+    Logger.logger.isEnabledFor.return_value = False
+
+    Logger.debug("message")
+
+    Logger.logger.isEnabledFor.assert_called_with(logging.DEBUG)
+    self.assertFalse(filter_text_mock.called)
+    self.assertFalse(Logger.logger.debug.called)
+
+  @patch.object(Logger, "_get_resource_repr")
+  def test_info_resource_skipped_when_level_disabled(self, get_resource_repr_mock):
+    Logger.logger.isEnabledFor.return_value = False
+
+    Logger.info_resource(MagicMock())
+
+    Logger.logger.isEnabledFor.assert_called_with(logging.INFO)
+    self.assertFalse(get_resource_repr_mock.called)
+    self.assertFalse(Logger.logger.info.called)
+
+  def test_info_logged_when_level_enabled(self):
+    Logger.logger.isEnabledFor.return_value = True
+
+    Logger.info("message")
+
+    Logger.logger.info.assert_called_with("message")
+
+  def test_filter_text(self):
+    Logger.add_sensitive_string("secret", "[PROTECTED]")
+    Logger.add_sensitive_string("-pw secret", "-pw [PROTECTED]")
+
+    self.assertEquals("kadmin -pw [PROTECTED] [PROTECTED]",
+                      Logger.filter_text("kadmin -pw secret secret"))
+    self.assertEquals("ls -la", Logger.filter_text("[RMF_EXPORT_PLACEHOLDER]ls -la"))
+
+    Logger.add_sensitive_string("other", "[PROTECTED]")
+    self.assertEquals("[PROTECTED] [PROTECTED]", Logger.filter_text("secret other"))
+
+  def test_filter_text_sensitive_strings_set_directly(self):
+    self.assertEquals("secret", Logger.filter_text("secret"))
+
+    Logger.sensitive_strings["secret"] = "[PROTECTED]"
+    self.assertEquals("[PROTECTED]", Logger.filter_text("secret"))
+
+  def test_get_function_repr(self):
+    def on_new_line():
+      pass
+
+    arguments = {
+      'user': u'hdfs',
+      'mode': 0755,
+      'content': 'x' * 1000,
+      'on_new_line': on_new_line,
+      'tries': 3,
+      'password': PasswordString(u'secret'),
+    }
+
+    function_repr = Logger.get_function_repr("Execute['ls']", arguments)
+    self.assertTrue(function_repr.startswith("Execute['ls'] {"))
+    self.assertTrue("'user': 'hdfs'" in function_repr)
+    self.assertTrue("'mode': 0755" in function_repr)
+    self.assertTrue("'content': ..." in function_repr)
+    self.assertTrue("'on_new_line': on_new_line" in function_repr)
+    self.assertTrue("'tries': 3" in function_repr)
+    self.assertTrue("'password': [PROTECTED]" in function_repr)
+    self.assertFalse("secret" in function_repr)
+    self.assertFalse(function_repr.endswith(", }"))
+
+    self.assertEquals("Execute['ls'] {}", Logger.get_function_repr("Execute['ls']", {}))
+
+  @patch("resource_management.core.shell.PLACEHOLDERS_TO_STR", {})
+  def test_filter_text_nothing_to_filter(self):
+    Logger.add_sensitive_string("", "[PROTECTED]")
+
+    self.assertEquals("ls -la", Logger.filter_text("ls -la"))
+    self.assertEquals("", Logger.filter_text(""))
+
+  def test_get_function_repr_non_int_mode(self):
+    function_repr = Logger.get_function_repr("File['/tmp/a']", {'mode': '0644'})
+
+    self.assertEquals("File['/tmp/a'] {'mode': '0644'}", function_repr)
+
+  def test_filter_text_longest_sensitive_string_first(self):
+    Logger.add_sensitive_string("abc", "***")
+    Logger.add_sensitive_string("pw=abc", "pw=[PROTECTED]")
+    Logger.add_sensitive_string("unchanged", "unchanged")
+
+    self.assertEquals("pw=[PROTECTED] unchanged", Logger.filter_text("pw=abc unchanged"))
+
+  def test_filter_text_new_placeholder(self):
+    self.assertEquals("[NEW_PLACEHOLDER]ls", Logger.filter_text("[NEW_PLACEHOLDER]ls"))
+
+    with patch.dict("resource_management.core.shell.PLACEHOLDERS_TO_STR", {"[NEW_PLACEHOLDER]": ""}):
+      self.assertEquals("ls", Logger.filter_text("[NEW_PLACEHOLDER]ls"))
@@ -31,12 +31,22 @@ from resource_management.core.source import InlineTemplate
 from tempfile import gettempdir
 from .utils import get_property_value
 
-KRB5_REALM_PROPERTIES = [
+KRB5_REALM_PROPERTIES = frozenset([
   'kdc',
   'admin_server',
   'default_domain',
   'master_kdc'
-]
+])
+
+# keytab file permission bits for the keytab_file_owner_access / keytab_file_group_access values,
+# owners can always read their keytab while groups get no access by default
+KEYTAB_OWNER_ACCESS_MODES = {
+  'rw': stat.S_IREAD | stat.S_IWRITE
+}
+KEYTAB_GROUP_ACCESS_MODES = {
+  'rw': stat.S_IRGRP | stat.S_IWGRP,
+  'r': stat.S_IRGRP
+}
 
 
 class MissingKeytabs(object):
@@ -109,6 +119,8 @@ def clear_tmp_cache():
 
 def write_keytab_file(params, output_hook=lambda principal, keytab_file_path: None):
   if params.kerberos_command_params is not None:
+    current_user = None
+
     for item in params.kerberos_command_params:
       keytab_content_base64 = get_property_value(item, 'keytab_content_base64')
       if (keytab_content_base64 is not None) and (len(keytab_content_base64) > 0):
@@ -120,21 +132,15 @@ def write_keytab_file(params, output_hook=lambda principal, keytab_file_path: No
 
           owner = get_property_value(item, 'keytab_file_owner_name')
           if not owner:
-            owner = getpass.getuser()
+            if current_user is None:
+              current_user = getpass.getuser()
+            owner = current_user
           owner_access = get_property_value(item, 'keytab_file_owner_access')
           group = get_property_value(item, 'keytab_file_group_name')
           group_access = get_property_value(item, 'keytab_file_group_access')
-          mode = 0
-
-          if owner_access == 'rw':
-            mode |= stat.S_IREAD | stat.S_IWRITE
-          else:
-            mode |= stat.S_IREAD
 
-          if group_access == 'rw':
-            mode |= stat.S_IRGRP | stat.S_IWGRP
-          elif group_access == 'r':
-            mode |= stat.S_IRGRP
+          mode = KEYTAB_OWNER_ACCESS_MODES.get(owner_access, stat.S_IREAD) | \
+                 KEYTAB_GROUP_ACCESS_MODES.get(group_access, 0)
 
           keytab_content = base64.b64decode(keytab_content_base64)
 
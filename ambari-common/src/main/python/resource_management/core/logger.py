@@ -29,6 +29,12 @@ from resource_management.core.utils import PasswordString
 MESSAGE_MAX_LEN = 512
 DICTIONARY_MAX_LEN = 5
 
+# bumped whenever Logger.sensitive_strings changes, so that filter_text knows when to rebuild
+_sensitive_strings_version = 0
+# (version, PLACEHOLDERS_TO_STR, (unprotected, protected) pairs longest first) used by filter_text,
+# kept in a single tuple so that threads never see a version paired with another build's strings
+_filter = None
+
 class Logger:
   logger = None
   # unprotected_strings : protected_strings map
@@ -60,55 +66,101 @@ class Logger:
 
   @staticmethod
   def exception(text):
-    Logger.logger.exception(Logger.filter_text(text))
+    if Logger.logger.isEnabledFor(logging.ERROR):
+      Logger.logger.exception(Logger.filter_text(text))
 
   @staticmethod
   def error(text):
-    Logger.logger.error(Logger.filter_text(text))
+    if Logger.logger.isEnabledFor(logging.ERROR):
+      Logger.logger.error(Logger.filter_text(text))
 
   @staticmethod
   def warning(text):
-    Logger.logger.warning(Logger.filter_text(text))
+    if Logger.logger.isEnabledFor(logging.WARNING):
+      Logger.logger.warning(Logger.filter_text(text))
 
   @staticmethod
   def info(text):
-    Logger.logger.info(Logger.filter_text(text))
+    if Logger.logger.isEnabledFor(logging.INFO):
+      Logger.logger.info(Logger.filter_text(text))
 
   @staticmethod
   def debug(text):
-    Logger.logger.debug(Logger.filter_text(text))
+    if Logger.logger.isEnabledFor(logging.DEBUG):
+      Logger.logger.debug(Logger.filter_text(text))
 
+  # the *_resource methods check the level before building the repr, since
+  # formatting resource arguments is the expensive part of logging them
   @staticmethod
   def error_resource(resource):
-    Logger.error(Logger.filter_text(Logger._get_resource_repr(resource)))
+    if Logger.logger.isEnabledFor(logging.ERROR):
+      Logger.logger.error(Logger.filter_text(Logger._get_resource_repr(resource)))
 
   @staticmethod
   def warning_resource(resource):
-    Logger.warning(Logger.filter_text(Logger._get_resource_repr(resource)))
+    if Logger.logger.isEnabledFor(logging.WARNING):
+      Logger.logger.warning(Logger.filter_text(Logger._get_resource_repr(resource)))
 
   @staticmethod
   def info_resource(resource):
-    Logger.info(Logger.filter_text(Logger._get_resource_repr(resource)))
+    if Logger.logger.isEnabledFor(logging.INFO):
+      Logger.logger.info(Logger.filter_text(Logger._get_resource_repr(resource)))
 
   @staticmethod
   def debug_resource(resource):
-    Logger.debug(Logger.filter_text(Logger._get_resource_repr(resource)))
+    if Logger.logger.isEnabledFor(logging.DEBUG):
+      Logger.logger.debug(Logger.filter_text(Logger._get_resource_repr(resource)))
     
+  @staticmethod
+  def add_sensitive_string(unprotected_string, protected_string):
+    """
+    Register a string which should be replaced by protected_string whenever it is logged
+    """
+    global _sensitive_strings_version
+
+    if Logger.sensitive_strings.get(unprotected_string) != protected_string:
+      Logger.sensitive_strings[unprotected_string] = protected_string
+      _sensitive_strings_version += 1
+
+  @staticmethod
+  def _build_filter(version):
+    """
+    Collect all sensitive strings and shell.py placeholders, longest first, so that a
+    string is not partially masked by one of its substrings.
+    """
+    # imported here, since shell.py imports this module
+    from resource_management.core.shell import PLACEHOLDERS_TO_STR
+
+    replacements = dict.fromkeys(PLACEHOLDERS_TO_STR, '')
+    replacements.update(Logger.sensitive_strings)
+
+    # skipping strings which would be replaced by themselves
+    pairs = sorted(((key, value) for key, value in replacements.iteritems() if key and key != value),
+                   key=lambda pair: len(pair[0]), reverse=True)
+
+    return version + (len(PLACEHOLDERS_TO_STR),), PLACEHOLDERS_TO_STR, tuple(pairs)
+
   @staticmethod    
   def filter_text(text):
     """
     Replace passwords with [PROTECTED] and remove shell.py placeholders
     """
-    from resource_management.core.shell import PLACEHOLDERS_TO_STR
-    
-    for unprotected_string, protected_string in Logger.sensitive_strings.iteritems():
-      text = text.replace(unprotected_string, protected_string)
+    global _filter
+
+    text_filter = _filter
+    # the size checks catch code which still writes to sensitive_strings directly,
+    # and placeholders added to shell.py's PLACEHOLDERS_TO_STR after the filter was built
+    version = (_sensitive_strings_version, len(Logger.sensitive_strings))
+    if text_filter is None or version + (len(text_filter[1]),) != text_filter[0]:
+      text_filter = _filter = Logger._build_filter(version)
 
-    for placeholder in PLACEHOLDERS_TO_STR.keys():
-      text = text.replace(placeholder, '')
+    for unprotected_string, protected_string in text_filter[2]:
+      # the 'in' scan is much cheaper than replace allocating a new string
+      if unprotected_string in text:
+        text = text.replace(unprotected_string, protected_string)
 
     return text
-  
+
   @staticmethod
   def _get_resource_repr(resource):
     return Logger.get_function_repr(repr(resource), resource.arguments, resource)
@@ -144,19 +196,19 @@ class Logger:
   
   @staticmethod
   def get_function_repr(name, arguments, resource=None):
-    logger_level = logging._levelNames[Logger.logger.level]
-
-    arguments_str = ""
+    parts = []
     for x,y in arguments.iteritems():
       # for arguments which want to override the output
-      if resource and 'log_str' in dir(resource._arguments[x]):
+      if resource and hasattr(resource._arguments[x], 'log_str'):
         val = resource._arguments[x].log_str(x, y)
       # don't show long arguments
       elif isinstance(y, basestring) and len(y) > MESSAGE_MAX_LEN:
         val = '...'
-      # strip unicode 'u' sign
+      # strip unicode 'u' sign, subclasses such as PasswordString may override repr without it
       elif isinstance(y, unicode):
-        val = repr(y).lstrip('u')
+        val = repr(y)
+        if val[:1] == 'u':
+          val = val[1:]
       # don't show dicts of configurations
       # usually too long
       elif isinstance(y, dict) and len(y) > DICTIONARY_MAX_LEN:
@@ -165,20 +217,16 @@ class Logger:
       elif isinstance(y, UnknownConfiguration):
         val = "[EMPTY]"
       # correctly output 'mode' (as they are octal values like 0755)
-      elif y and x == 'mode':
-        try:
-          val = oct(y)
-        except:
-          val = repr(y)
+      elif y and x == 'mode' and isinstance(y, (int, long)):
+        val = oct(y)
       # for functions show only function name
-      elif hasattr(y, '__call__') and hasattr(y, '__name__'):
+      elif callable(y) and hasattr(y, '__name__'):
         val = y.__name__
       else:
         val = repr(y)
 
-      arguments_str += "'{0}': {1}, ".format(x, val)
+      parts.append("'%s': %s" % (x, val))
+
+    arguments_str = ", ".join(parts)
 
-    if arguments_str:
-      arguments_str = arguments_str[:-2]
-        
     return unicode("{0} {{{1}}}", 'UTF-8').format(name, arguments_str)
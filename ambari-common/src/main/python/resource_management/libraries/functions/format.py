@@ -62,7 +62,7 @@ class ConfigurationFormatter(Formatter):
     result_unprotected = self.vformat(format_string, args, all_params)
     
     if result_protected != result_unprotected:
-      Logger.sensitive_strings[result_unprotected] = result_protected
+      Logger.add_sensitive_string(result_unprotected, result_protected)
       
     return result_unprotected
   
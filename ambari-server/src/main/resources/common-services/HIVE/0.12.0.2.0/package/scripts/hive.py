@@ -366,8 +366,8 @@ def create_metastore_schema():
   if quoted_hive_metastore_user_passwd[0] == "'" and quoted_hive_metastore_user_passwd[-1] == "'" \
       or quoted_hive_metastore_user_passwd[0] == '"' and quoted_hive_metastore_user_passwd[-1] == '"':
     quoted_hive_metastore_user_passwd = quoted_hive_metastore_user_passwd[1:-1]
-  Logger.sensitive_strings[repr(check_schema_created_cmd)] = repr(check_schema_created_cmd.replace(
-      format("-passWord {quoted_hive_metastore_user_passwd}"), "-passWord " + utils.PASSWORDS_HIDE_STRING))
+  Logger.add_sensitive_string(repr(check_schema_created_cmd), repr(check_schema_created_cmd.replace(
+      format("-passWord {quoted_hive_metastore_user_passwd}"), "-passWord " + utils.PASSWORDS_HIDE_STRING)))
 
   Execute(create_schema_cmd,
           not_if = check_schema_created_cmd,
@@ -17,13 +17,18 @@ limitations under the License.
 
 """
 
+import atexit
 import base64
+import errno
 import getpass
 import os
+import stat
 import string
 from ambari_commons import subprocess32
 import sys
 import tempfile
+import threading
+from contextlib import contextmanager
 from tempfile import gettempdir
 
 from resource_management import *
@@ -34,15 +39,67 @@ from collections import namedtuple
 from resource_management.core import sudo
 from resource_management.core.resources.klist import Klist
 
+PASSWORD_LENGTH = 13
+PASSWORD_CHARS = string.digits + string.ascii_letters
+# maps every random byte onto PASSWORD_CHARS; bytes past the last whole multiple of
+# len(PASSWORD_CHARS) are dropped so that no character is more likely than another
+_PASSWORD_TABLE = ''.join(PASSWORD_CHARS[b % len(PASSWORD_CHARS)] for b in range(256))
+_PASSWORD_REJECTED_BYTES = ''.join(chr(b) for b in range(256 - 256 % len(PASSWORD_CHARS), 256))
+
+# per thread temporary file that decoded keytabs are written to, see _scratch_keytab
+_scratch = threading.local()
+
+def _remove_scratch_file(scratch_file):
+  scratch_file.close()
+  try:
+    os.remove(scratch_file.name)
+  except OSError:
+    pass
+
+@contextmanager
+def _scratch_keytab(keytab_base64):
+  """
+  Decodes a base64-encoded keytab into this thread's scratch file and yields its path.
+
+  The file is created once and reused, rather than creating and removing a temporary
+  file for every keytab. It is emptied again on exit, so no keytab data stays on disk,
+  and removed when the process exits.
+
+  Not reentrant: there is one scratch file per thread, so a nested use would overwrite
+  the keytab kadmin or kinit is still reading. Nested use raises Fail instead.
+  """
+  if getattr(_scratch, 'in_use', False):
+    raise Fail("The scratch keytab file of this thread is already in use")
+
+  scratch_file = getattr(_scratch, 'keytab_file', None)
+  if scratch_file is None:
+    scratch_file = tempfile.NamedTemporaryFile(delete=False)
+    atexit.register(_remove_scratch_file, scratch_file)
+    _scratch.keytab_file = scratch_file
+
+  _scratch.in_use = True
+  try:
+    scratch_file.seek(0)
+    scratch_file.truncate()
+    scratch_file.write(base64.b64decode(keytab_base64))
+    scratch_file.flush()
+
+    yield scratch_file.name
+  finally:
+    scratch_file.seek(0)
+    scratch_file.truncate()
+    scratch_file.flush()
+    _scratch.in_use = False
+
 class KerberosScript(Script):
-  KRB5_REALM_PROPERTIES = [
+  KRB5_REALM_PROPERTIES = frozenset([
     'kdc',
     'admin_server',
     'default_domain',
     'master_kdc'
-  ]
+  ])
 
-  KRB5_SECTION_NAMES = [
+  KRB5_SECTION_NAMES = frozenset([
     'libdefaults',
     'logging',
     'realms',
@@ -51,28 +108,29 @@ class KerberosScript(Script):
     'ca_paths',
     'appdefaults',
     'plugins'
-  ]
+  ])
 
   @staticmethod
   def create_random_password():
-    import random
-
-    chars = string.digits + string.ascii_letters
-    return ''.join(random.choice(chars) for x in range(13))
+    password = ''
+    while len(password) < PASSWORD_LENGTH:
+      password += os.urandom(PASSWORD_LENGTH).translate(_PASSWORD_TABLE, _PASSWORD_REJECTED_BYTES)
+    return password[:PASSWORD_LENGTH]
 
   @staticmethod
   def write_conf_section(output_file, section_name, section_data):
     if section_name is not None:
-      output_file.write('[%s]\n' % section_name)
+      lines = ['[%s]\n' % section_name]
 
       if section_data is not None:
-        for key, value in section_data.iteritems():
-          output_file.write(" %s = %s\n" % (key, value))
+        lines.extend(" %s = %s\n" % (key, value) for key, value in section_data.iteritems())
+
+      output_file.write(''.join(lines))
 
 
   @staticmethod
-  def _write_conf_realm(output_file, realm_name, realm_data):
-    """ Writes out realm details
+  def _format_conf_realm(realm_name, realm_data):
+    """ Formats realm details
 
     Example:
 
@@ -82,25 +140,31 @@ class KerberosScript(Script):
      }
 
     """
+    lines = []
+
     if realm_name is not None:
-      output_file.write(" %s = {\n" % realm_name)
+      lines.append(" %s = {\n" % realm_name)
 
       if realm_data is not None:
         for key, value in realm_data.iteritems():
           if key in KerberosScript.KRB5_REALM_PROPERTIES:
-            output_file.write("  %s = %s\n" % (key, value))
+            lines.append("  %s = %s\n" % (key, value))
+
+      lines.append(" }\n")
 
-      output_file.write(" }\n")
+    return ''.join(lines)
 
   @staticmethod
   def write_conf_realms_section(output_file, section_name, realms_data):
     if section_name is not None:
-      output_file.write('[%s]\n' % section_name)
+      lines = ['[%s]\n' % section_name]
 
       if realms_data is not None:
         for realm, realm_data in realms_data.iteritems():
-          KerberosScript._write_conf_realm(output_file, realm, realm_data)
-          output_file.write('\n')
+          lines.append(KerberosScript._format_conf_realm(realm, realm_data))
+          lines.append('\n')
+
+      output_file.write(''.join(lines))
 
   @staticmethod
   def write_krb5_conf():
@@ -122,6 +186,43 @@ class KerberosScript(Script):
          mode=0644
     )
 
+  @staticmethod
+  @contextmanager
+  def _kadmin_command(admin_identity=None, default_realm=None):
+    """
+    Yields the kadmin or kadmin.local command (depending on whether auth_identity is set or not),
+    without any query. The administrator's keytab, if any, is only on disk while this is active.
+
+    :param admin_identity: the identity for the administrative user (optional)
+    :param default_realm: the default realm to assume
+    """
+    auth_principal = None
+    auth_keytab = None
+
+    if admin_identity is not None:
+      auth_principal = get_property_value(admin_identity, 'principal')
+
+    if auth_principal is None:
+      command = ['kadmin.local']
+    else:
+      command = ['kadmin', '-p', auth_principal]
+
+      auth_password = get_property_value(admin_identity, 'password')
+
+      if auth_password is None:
+        auth_keytab = get_property_value(admin_identity, 'keytab')
+      else:
+        command.extend(['-w', auth_password])
+
+    if (default_realm is not None) and (len(default_realm) > 0):
+      command.extend(['-r', default_realm])
+
+    if auth_keytab is None:
+      yield command
+    else:
+      with _scratch_keytab(auth_keytab) as auth_keytab_file:
+        yield command + ['-k', '-t', auth_keytab_file]
+
   @staticmethod
   def invoke_kadmin(query, admin_identity=None, default_realm=None):
     """
@@ -134,46 +235,35 @@ class KerberosScript(Script):
     :return: return_code, out
     """
     if (query is not None) and (len(query) > 0):
-      auth_principal = None
-      auth_keytab_file = None
-
-      if admin_identity is not None:
-        auth_principal = get_property_value(admin_identity, 'principal')
+      with KerberosScript._kadmin_command(admin_identity, default_realm) as command:
+        # passed as a tuple so that shell.py quotes every argument itself
+        return shell.checked_call(tuple(command + ['-q', query]))
 
-      if auth_principal is None:
-        kadmin = 'kadmin.local'
-        credential = ''
-      else:
-        kadmin = 'kadmin -p "%s"' % auth_principal
-
-        auth_password = get_property_value(admin_identity, 'password')
-
-        if auth_password is None:
-          auth_keytab = get_property_value(admin_identity, 'keytab')
+  @staticmethod
+  def invoke_kadmin_batch(queries, admin_identity=None, default_realm=None):
+    """
+    Executes several queries in a single kadmin or kadmin.local session, by feeding them
+    to its standard input, and returns command result code and standard out data.
 
-          if auth_keytab is not None:
-            (fd, auth_keytab_file) = tempfile.mkstemp()
-            keytab_file_path = keytab_file_path.replace("_HOST", params.hostname)
-            os.write(fd, base64.b64decode(auth_keytab))
-            os.close(fd)
+    :param queries: the kadmin queries to execute
+    :param admin_identity: the identity for the administrative user (optional)
+    :param default_realm: the default realm to assume
+    :return: return_code, out
+    """
+    queries = [query for query in queries if (query is not None) and (len(query) > 0)]
 
-          credential = '-k -t %s' % auth_keytab_file
-        else:
-          credential = '-w "%s"' % auth_password
-
-      if (default_realm is not None) and (len(default_realm) > 0):
-        realm = '-r %s' % default_realm
-      else:
-        realm = ''
+    if queries:
+      # mkstemp creates the file readable by its owner only, queries may contain passwords
+      (fd, queries_file) = tempfile.mkstemp()
+      with os.fdopen(fd, 'w') as f:
+        f.write('\n'.join(queries) + '\n')
 
       try:
-        command = '%s %s %s -q "%s"' % (kadmin, credential, realm, query.replace('"', '\\"'))
-        return shell.checked_call(command)
-      except:
-        raise
+        with KerberosScript._kadmin_command(admin_identity, default_realm) as command:
+          return shell.checked_call('%s < %s' % (shell.string_cmd_from_args_list(command),
+                                                 shell.quote_bash_args(queries_file)))
       finally:
-        if auth_keytab_file is not None:
-          os.remove(auth_keytab_file)
+        os.remove(queries_file)
 
   @staticmethod
   def create_keytab_file(principal, path, auth_identity=None):
@@ -203,18 +293,30 @@ class KerberosScript(Script):
 
   @staticmethod
   def create_keytab(principal, auth_identity=None):
+    keytab = KerberosScript.create_keytab_bytes(principal, auth_identity)
+
+    # base64 only for callers that need the keytab as text
+    return base64.b64encode(keytab) if keytab is not None else None
+
+  @staticmethod
+  def create_keytab_bytes(principal, auth_identity=None):
     keytab = None
 
+    # kadmin ktadd must create the keytab itself, only a unique name is needed here
     (fd, temp_path) = tempfile.mkstemp()
+    os.close(fd)
     os.remove(temp_path)
 
     try:
       if KerberosScript.create_keytab_file(principal, temp_path, auth_identity):
-        with open(temp_path, 'r') as f:
-          keytab = base64.b64encode(f.read())
+        with open(temp_path, 'rb') as f:
+          keytab = f.read()
     finally:
-      if os.path.isfile(temp_path):
+      try:
         os.remove(temp_path)
+      except OSError as e:
+        if e.errno != errno.ENOENT:
+          raise
 
     return keytab
 
@@ -235,6 +337,75 @@ class KerberosScript(Script):
 
     return exists
 
+  @staticmethod
+  def list_principals(auth_identity=None, default_realm=None):
+    """
+    Lists every principal known to the KDC with a single kadmin listprincs query.
+
+    :return: a frozenset of principals, see _parse_principals
+    """
+    try:
+      result_code, output = KerberosScript.invoke_kadmin('listprincs', auth_identity, default_realm)
+    except:
+      raise Fail("Failed to list principals")
+
+    return KerberosScript._parse_principals(output, default_realm)
+
+  @staticmethod
+  def _parse_principals(output, default_realm=None):
+    """
+    Parses the output of kadmin listprincs.
+
+    Principals of the default realm are also included without their realm, since that is
+    what getprinc resolves a realm-less name to. When default_realm is not given, the
+    KDC's default realm is taken from kadmin's "Authenticating as principal" message.
+
+    :return: a frozenset of principals
+    """
+    auth_message = 'Authenticating as principal '
+    principals = set()
+
+    for line in (output or '').splitlines():
+      line = line.strip()
+
+      if line.startswith(auth_message):
+        auth_principal = line[len(auth_message):].split(' ', 1)[0]
+        if not default_realm and '@' in auth_principal:
+          default_realm = auth_principal.rsplit('@', 1)[1]
+      # skip any other kadmin messages
+      elif line and ' ' not in line:
+        principals.add(line)
+
+    if default_realm:
+      realm_suffix = '@' + default_realm
+      principals.update([principal[:-len(realm_suffix)] for principal in principals
+                         if principal.endswith(realm_suffix)])
+
+    return frozenset(principals)
+
+  @staticmethod
+  def principals_exist(identities, auth_identity=None, default_realm=None):
+    """
+    Same as calling principal_exists for each of the identities, but with one kadmin
+    invocation in total rather than one per identity.
+
+    :return: a list of booleans, one per identity
+    """
+    existing = None
+    exists = []
+
+    for identity in identities:
+      principal = get_property_value(identity, 'principal') if identity is not None else None
+
+      if (principal is not None) and (len(principal) > 0):
+        if existing is None:
+          existing = KerberosScript.list_principals(auth_identity, default_realm)
+        exists.append(principal in existing)
+      else:
+        exists.append(False)
+
+    return exists
+
   @staticmethod
   def change_principal_password(identity, auth_identity=None):
     success = False
@@ -261,6 +432,17 @@ class KerberosScript(Script):
 
     return success
 
+  @staticmethod
+  def _addprinc_query(identity, principal):
+    password = get_property_value(identity, 'password')
+
+    if password is None:
+      credentials = '-randkey'
+    else:
+      credentials = '-pw "%s"' % password
+
+    return 'addprinc %s %s' % (credentials, principal)
+
   @staticmethod
   def create_principal(identity, auth_identity=None):
     success = False
@@ -269,16 +451,9 @@ class KerberosScript(Script):
       principal = get_property_value(identity, 'principal')
 
       if (principal is not None) and (len(principal) > 0):
-        password = get_property_value(identity, 'password')
-
-        if password is None:
-          credentials = '-randkey'
-        else:
-          credentials = '-pw "%s"' % password
-
         try:
           result_code, out = KerberosScript.invoke_kadmin(
-            'addprinc %s %s' % (credentials, principal),
+            KerberosScript._addprinc_query(identity, principal),
             auth_identity)
 
           success = (result_code == 0)
@@ -298,8 +473,22 @@ class KerberosScript(Script):
   @staticmethod
   def create_principals(identities, auth_identity=None):
     if identities is not None:
+      principals = []
+      queries = []
+
       for identity in identities:
-        KerberosScript.create_principal(identity, auth_identity)
+        if identity is not None:
+          principal = get_property_value(identity, 'principal')
+
+          if (principal is not None) and (len(principal) > 0):
+            principals.append(principal)
+            queries.append(KerberosScript._addprinc_query(identity, principal))
+
+      # one kadmin session for all of the principals, rather than one per principal
+      try:
+        KerberosScript.invoke_kadmin_batch(queries, auth_identity)
+      except:
+        raise Fail("Failed to create principals: %s" % ", ".join(principals))
 
   @staticmethod
   def create_or_update_administrator_identity():
@@ -333,24 +522,15 @@ class KerberosScript(Script):
         )
         return shell.checked_call(kdestroy_path_local)
 
-      # If base64-encoded test keytab data is available; then decode it, write it to a temporary file
-      # use it, and then remove the temporary file
+      # If base64-encoded test keytab data is available; then decode it, write it to the scratch
+      # keytab file and use it
       elif keytab is not None:
-        (fd, test_keytab_file) = tempfile.mkstemp()
-        os.write(fd, base64.b64decode(keytab))
-        os.close(fd)
-
-        try:
+        with _scratch_keytab(keytab) as test_keytab_file:
           command = '%s -k -t %s %s' % (kinit_path_local, test_keytab_file, principal)
           Execute(command,
             user = user,
           )
           return shell.checked_call(kdestroy_path_local)
-        except:
-          raise
-        finally:
-          if test_keytab_file is not None:
-            os.remove(test_keytab_file)
 
       # If no keytab data is available and a password was supplied, simply use it.
       elif password is not None:
@@ -369,7 +549,6 @@ class KerberosScript(Script):
 
   def write_keytab_file(self):
     import params
-    import stat
 
     if params.kerberos_command_params is not None:
       for item  in params.kerberos_command_params:
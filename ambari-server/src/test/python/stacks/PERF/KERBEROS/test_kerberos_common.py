@@ -0,0 +1,221 @@
+#!/usr/bin/env python
+
+'''
+Licensed to the Apache Software Foundation (ASF) under one
+or more contributor license agreements.  See the NOTICE file
+distributed with this work for additional information
+regarding copyright ownership.  The ASF licenses this file
+to you under the Apache License, Version 2.0 (the
+"License"); you may not use this file except in compliance
+with the License.  You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+'''
+
+# System imports
+import base64
+import os
+import shutil
+import sys
+import tempfile
+from unittest import TestCase
+from mock.mock import patch
+
+from resource_management.core import shell
+from resource_management.core.exceptions import Fail
+
+PERF_KERBEROS_SCRIPTS_DIR = "PERF/1.0/services/KERBEROS/package/scripts"
+
+file_path = os.path.dirname(os.path.abspath(__file__))
+file_path = os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(file_path)))))
+file_path = os.path.join(file_path, "main", "resources", "stacks", PERF_KERBEROS_SCRIPTS_DIR)
+
+LISTPRINCS_OUTPUT = """Authenticating as principal admin/admin@EXAMPLE.COM with password.
+HTTP/c6401.ambari.apache.org@EXAMPLE.COM
+K/M@EXAMPLE.COM
+hdfs-cl1@EXAMPLE.COM
+krbtgt/EXAMPLE.COM@EXAMPLE.COM
+yarn@OTHER.REALM
+"""
+
+# passed through to kadmin unchanged, bash must not expand $$ or the backticks
+KADMIN_QUERY = 'addprinc -pw "a$$b`id`" hdfs@EXAMPLE.COM'
+
+class TestKerberosCommon(TestCase):
+
+  def setUp(self):
+    """
+    Import the module under test.
+    Because the module is present in a different folder, prepend its dir to the system path,
+    so that its own utils module is found.
+    """
+    sys.path.insert(0, file_path)
+    global kerberos_common, KerberosScript
+    import kerberos_common
+    from kerberos_common import KerberosScript
+
+    # a space in the path makes shell.py quote it
+    self.tmp_dir = tempfile.mkdtemp()
+    self.queries_file = os.path.join(self.tmp_dir, "kadmin queries")
+
+  def tearDown(self):
+    sys.path.remove(file_path)
+    shutil.rmtree(self.tmp_dir)
+
+  def _mkstemp(self):
+    return os.open(self.queries_file, os.O_CREAT | os.O_RDWR, 0600), self.queries_file
+
+  def test_parse_principals(self):
+    principals = KerberosScript._parse_principals(LISTPRINCS_OUTPUT)
+
+    self.assertTrue("hdfs-cl1@EXAMPLE.COM" in principals)
+    self.assertTrue("hdfs-cl1" in principals)
+    self.assertTrue("HTTP/c6401.ambari.apache.org" in principals)
+    self.assertTrue("yarn@OTHER.REALM" in principals)
+    # only principals of the default realm can be found without their realm
+    self.assertFalse("yarn" in principals)
+    self.assertFalse("Authenticating" in principals)
+    self.assertFalse("admin/admin@EXAMPLE.COM" in principals)
+
+  def test_parse_principals_default_realm(self):
+    principals = KerberosScript._parse_principals(LISTPRINCS_OUTPUT, "OTHER.REALM")
+
+    self.assertTrue("yarn" in principals)
+    self.assertFalse("hdfs-cl1" in principals)
+
+  def test_parse_principals_unknown_realm(self):
+    principals = KerberosScript._parse_principals("hdfs@EXAMPLE.COM\n")
+
+    self.assertEquals(frozenset(["hdfs@EXAMPLE.COM"]), principals)
+
+  def test_principals_exist(self):
+    identities = [{'principal': 'hdfs-cl1'}, {'principal': 'yarn'}, {'principal': 'K/M@EXAMPLE.COM'}, None]
+
+    with patch.object(KerberosScript, "invoke_kadmin", return_value=(0, LISTPRINCS_OUTPUT)) as invoke_kadmin_mock:
+      self.assertEquals([True, False, True, False], KerberosScript.principals_exist(identities))
+
+    invoke_kadmin_mock.assert_called_once_with('listprincs', None, None)
+
+  def test_create_principals(self):
+    identities = [{'principal': 'hdfs@EXAMPLE.COM'}, {'password': 'secret'}, None, {'principal': ''},
+                  {'principal': 'yarn@EXAMPLE.COM', 'password': 'secret'}]
+    queries = []
+
+    def checked_call(command):
+      with open(self.queries_file) as f:
+        queries.append(f.read())
+      return 0, ''
+
+    with patch.object(kerberos_common.tempfile, "mkstemp", side_effect=self._mkstemp), \
+         patch.object(shell, "checked_call", side_effect=checked_call) as checked_call_mock:
+      KerberosScript.create_principals(identities)
+
+    checked_call_mock.assert_called_once_with("kadmin.local < '%s'" % self.queries_file)
+    self.assertEquals(['addprinc -randkey hdfs@EXAMPLE.COM\n'
+                       'addprinc -pw "secret" yarn@EXAMPLE.COM\n'], queries)
+    self.assertFalse(os.path.exists(self.queries_file))
+
+  def test_create_principals_failure(self):
+    identities = [{'principal': 'hdfs@EXAMPLE.COM'}, {'principal': 'yarn@EXAMPLE.COM'}]
+
+    with patch.object(kerberos_common.tempfile, "mkstemp", side_effect=self._mkstemp), \
+         patch.object(shell, "checked_call", side_effect=Fail("kadmin failed")):
+      try:
+        KerberosScript.create_principals(identities)
+        self.fail("Fail was expected")
+      except Fail as e:
+        self.assertEquals("Failed to create principals: hdfs@EXAMPLE.COM, yarn@EXAMPLE.COM", str(e))
+
+    self.assertFalse(os.path.exists(self.queries_file))
+
+  def test_create_principals_nothing_to_create(self):
+    with patch.object(shell, "checked_call") as checked_call_mock:
+      KerberosScript.create_principals(None)
+      KerberosScript.create_principals([])
+      KerberosScript.create_principals([None, {'principal': ''}])
+
+    self.assertFalse(checked_call_mock.called)
+
+  def test_scratch_keytab(self):
+    with kerberos_common._scratch_keytab(base64.b64encode("keytab data")) as keytab_file:
+      with open(keytab_file, 'rb') as f:
+        self.assertEquals("keytab data", f.read())
+
+    self.assertEquals(0, os.path.getsize(keytab_file))
+
+    # the same file is reused for the next keytab
+    with kerberos_common._scratch_keytab(base64.b64encode("other")) as other_keytab_file:
+      self.assertEquals(keytab_file, other_keytab_file)
+      with open(other_keytab_file, 'rb') as f:
+        self.assertEquals("other", f.read())
+
+    self.assertEquals(0, os.path.getsize(keytab_file))
+
+  def test_scratch_keytab_emptied_on_exception(self):
+    try:
+      with kerberos_common._scratch_keytab(base64.b64encode("keytab data")) as keytab_file:
+        raise ValueError()
+    except ValueError:
+      pass
+
+    self.assertEquals(0, os.path.getsize(keytab_file))
+    self.assertFalse(kerberos_common._scratch.in_use)
+
+  def test_scratch_keytab_nested(self):
+    with kerberos_common._scratch_keytab(base64.b64encode("keytab data")) as keytab_file:
+      try:
+        with kerberos_common._scratch_keytab(base64.b64encode("other")):
+          pass
+        self.fail("Fail was expected")
+      except Fail:
+        pass
+
+      # the outer keytab is left untouched
+      with open(keytab_file, 'rb') as f:
+        self.assertEquals("keytab data", f.read())
+
+    self.assertFalse(kerberos_common._scratch.in_use)
+
+  def test_invoke_kadmin_password(self):
+    admin_identity = {'principal': 'admin/admin@EXAMPLE.COM', 'password': 'admin secret'}
+
+    with patch.object(shell, "checked_call", return_value=(0, '')) as checked_call_mock:
+      KerberosScript.invoke_kadmin(KADMIN_QUERY, admin_identity, 'EXAMPLE.COM')
+
+    checked_call_mock.assert_called_once_with(
+      ('kadmin', '-p', 'admin/admin@EXAMPLE.COM', '-w', 'admin secret', '-r', 'EXAMPLE.COM', '-q', KADMIN_QUERY))
+    self.assertEquals("-q '%s'" % KADMIN_QUERY,
+                      shell.string_cmd_from_args_list(checked_call_mock.call_args[0][0][-2:]))
+
+  def test_invoke_kadmin_keytab(self):
+    admin_identity = {'principal': 'admin/admin@EXAMPLE.COM', 'keytab': base64.b64encode("keytab data")}
+    keytabs = []
+
+    def checked_call(command):
+      with open(command[-3], 'rb') as f:
+        keytabs.append(f.read())
+      return 0, ''
+
+    with patch.object(shell, "checked_call", side_effect=checked_call) as checked_call_mock:
+      KerberosScript.invoke_kadmin(KADMIN_QUERY, admin_identity, 'EXAMPLE.COM')
+
+    keytab_file = kerberos_common._scratch.keytab_file.name
+    checked_call_mock.assert_called_once_with(
+      ('kadmin', '-p', 'admin/admin@EXAMPLE.COM', '-r', 'EXAMPLE.COM', '-k', '-t', keytab_file, '-q', KADMIN_QUERY))
+    self.assertEquals(["keytab data"], keytabs)
+
+  def test_invoke_kadmin_no_credentials(self):
+    with patch.object(shell, "checked_call", return_value=(0, '')) as checked_call_mock:
+      KerberosScript.invoke_kadmin(KADMIN_QUERY, {'principal': 'admin/admin@EXAMPLE.COM'})
+      KerberosScript.invoke_kadmin(KADMIN_QUERY)
+
+    self.assertEquals([
+      ((('kadmin', '-p', 'admin/admin@EXAMPLE.COM', '-q', KADMIN_QUERY),), {}),
+      ((('kadmin.local', '-q', KADMIN_QUERY),), {}),
+    ], checked_call_mock.call_args_list)